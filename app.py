@@ -1,67 +1,301 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, stream_with_context
+from flask.json.provider import JSONProvider
 import os
+import logging
 import base64
+import asyncio
+import threading
+import queue
+import io
+import orjson
+import hashlib
+import time
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pybase64
+import ahocorasick
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import openai
+import httpx
 from datetime import datetime
-import uuid
+import secrets
 from PIL import Image, ImageOps
 
+# Log level comes from LOG_LEVEL (default INFO); per-step pipeline tracing is DEBUG
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson - jsonify and request.get_json go through this"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # jsonify - hand orjson's bytes straight to the response, no str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+            mimetype='application/json'
+        )
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-change-this-in-production')
 
 # Configuration
 UPLOAD_FOLDER = 'static/uploads'
+PROCESSED_FOLDER = 'static/processed'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+MAX_BATCH_FILES = 10
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Ensure upload directory exists
+# Ensure upload and processed directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
 # OpenAI API Key - From environment variable (required for Hugging Face Spaces)
 openai.api_key = os.getenv('OPENAI_API_KEY', '')
 if not openai.api_key:
-    print("⚠️ Warning: OPENAI_API_KEY environment variable not set. Please set it in Hugging Face Spaces secrets.")
+    logger.warning("⚠️ Warning: OPENAI_API_KEY environment variable not set. Please set it in Hugging Face Spaces secrets.")
 else:
-    print("✅ OpenAI API Key configured successfully!")
+    logger.info("✅ OpenAI API Key configured successfully!")
+
+# Shared async OpenAI client - all AI calls run on one background event loop so
+# a single process can keep many requests in flight without blocking workers.
+# Built once so its HTTP/2 connection pool to api.openai.com is reused across requests
+client = openai.AsyncOpenAI(
+    api_key=openai.api_key,
+    timeout=60.0,
+    max_retries=2,
+    http_client=openai.DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+    )
+)
+event_loop = asyncio.new_event_loop()
+threading.Thread(target=event_loop.run_forever, name='openai-event-loop', daemon=True).start()
+
+# Limit concurrent OpenAI requests across all in-flight analyses
+openai_semaphore = asyncio.Semaphore(8)
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, event_loop).result()
+
+# File I/O pool - writes processed previews and serves the occasional disk read the
+# AI pipeline needs, so blocking syscalls never run on the event loop
+io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='image-io')
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def write_file_once(path, data):
+    """Write a content-addressed file unless it already exists
+    
+    The data goes to a temp file in the same directory that is then renamed into
+    place, so readers (and concurrent writers of the same content) never see a
+    partial file and a crash mid-write can't leave one behind.
+    """
+    if os.path.exists(path):
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+# Decode/resize pool for process_image - Pillow releases the GIL in its codecs and
+# resamplers, so images in a batch are prepared in parallel while others wait on OpenAI
+image_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix='image-process')
+
+class AIAnalysisCache:
+    """Least-recently-used cache with a time-to-live for AI results
+    
+    Thread-safe, so it can be read from request threads as well as the event loop.
+    """
+    
+    def __init__(self, maxsize=1024, ttl=24 * 60 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def __contains__(self, key):
+        """Check for a live entry without counting a hit or miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+    
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl
+            }
+
+def content_hash(data):
+    """128-bit BLAKE2b digest used as a content-addressed cache key"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# AI results keyed by content hash - identical images/analyses skip the OpenAI call.
+# result_cache holds the whole pipeline output per processed image, so a re-upload
+# skips vision, recommendations and categorisation in one lookup
+analysis_cache = AIAnalysisCache()
+recommendations_cache = AIAnalysisCache()
+result_cache = AIAnalysisCache()
+
+# Result timestamps only need second resolution, so format each second once
+timestamp_cache = (0, '')
+
+def iso_now():
+    """Current local time as an ISO 8601 string (second resolution)"""
+    global timestamp_cache
+    second, text = timestamp_cache
+    now = int(time.time())
+    if now != second:
+        text = datetime.fromtimestamp(now).isoformat()
+        timestamp_cache = (now, text)
+    return text
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_image(image_path, max_size=(1024, 1024), quality=85):
-    """Process and optimize image for better analysis"""
+def process_image(image, max_size=(1024, 1024), quality=85):
+    """Process and optimize image for better analysis
+    
+    `image` is a path or the raw encoded image bytes. Returns a dict with the
+    processed JPEG bytes ('data'), its image info, the preview path and the future
+    of the background write of that preview.
+    """
     try:
-        with Image.open(image_path) as img:
+        with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as img:
+            # Let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) instead of
+            # decoding full resolution only to throw most pixels away
+            if img.format == 'JPEG':
+                img.draft('RGB', max_size)
+            
+            # Palette images only resample with NEAREST, so expand them first
+            if img.mode == 'P':
+                img = img.convert('RGB')
+            
+            # Resize if too large while maintaining aspect ratio - done before any
+            # other per-pixel work so conversion and rotation touch the small image.
+            # The bounding box is square, so rotating afterwards gives the same size
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            
             # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
+            if img.mode in ('RGBA', 'LA'):
                 img = img.convert('RGB')
             
             # Auto-orient based on EXIF data
             img = ImageOps.exif_transpose(img)
             
-            # Resize if too large while maintaining aspect ratio
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            # Encode processed image in memory - progressive encoding with 4:2:0 chroma
+            # subsampling keeps the payload sent to the Vision API small; EXIF/ICC data
+            # is not carried over since orientation was already applied
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True, subsampling=2)
+            processed_data = buffer.getvalue()
             
-            # Create processed directory if it doesn't exist
-            processed_dir = 'static/processed'
-            os.makedirs(processed_dir, exist_ok=True)
+            # Name the preview after its content - identical images share one file,
+            # and the name can be cached by browsers forever
+            processed_hash = content_hash(processed_data)
+            processed_path = os.path.join(PROCESSED_FOLDER, f"processed_{processed_hash}.jpg")
             
-            # Generate processed filename
-            filename = os.path.basename(image_path)
-            name, ext = os.path.splitext(filename)
-            processed_filename = f"processed_{uuid.uuid4().hex}.jpg"
-            processed_path = os.path.join(processed_dir, processed_filename)
+            return {
+                'path': processed_path,
+                'data': processed_data,
+                'hash': processed_hash,
+                'info': {
+                    'size': img.size,
+                    'mode': img.mode,
+                    'format': 'JPEG',
+                    'file_size': len(processed_data)
+                },
+                # Preview is only needed by the results page, so write it off the hot path
+                'saved': io_executor.submit(write_file_once, processed_path, processed_data)
+            }
             
-            # Save processed image
-            img.save(processed_path, 'JPEG', quality=quality, optimize=True)
+    except Exception as e:
+        logger.warning("Image processing error: %s", e)
+        # Return original if processing fails
+        if isinstance(image, bytes):
+            return {'path': None, 'data': image, 'hash': None, 'info': None, 'saved': None}
+        return {
+            'path': image,
+            'data': None,
+            'hash': None,
+            'info': get_image_info(image),
+            'saved': None
+        }
+
+# Vision API 'low' detail looks at a 512x512 version of the image, so anything
+# bigger is upload bandwidth spent for nothing
+LOW_DETAIL_SIZE = (512, 512)
+
+def downscale_image(image_data, max_size=LOW_DETAIL_SIZE, quality=85):
+    """Re-encode image bytes to fit within max_size (returned unchanged if they already fit)"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            if img.width <= max_size[0] and img.height <= max_size[1]:
+                return image_data
             
-            return processed_path
+            # A 1024px processed JPEG decodes straight to 512px via DCT scaling
+            if img.format == 'JPEG':
+                img.draft('RGB', max_size)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
             
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True, subsampling=2)
+            return buffer.getvalue()
     except Exception as e:
-        print(f"Image processing error: {e}")
-        return image_path  # Return original if processing fails
+        logger.warning("Image downscale error: %s", e)
+        return image_data
 
 def get_image_info(image_path):
     """Get basic image information"""
@@ -74,32 +308,30 @@ def get_image_info(image_path):
                 'file_size': os.path.getsize(image_path)
             }
     except Exception as e:
-        print(f"Error getting image info: {e}")
+        logger.warning("Error getting image info: %s", e)
         return None
 
+def encode_image_data_uri(image_data, chunk_size=3 * 256 * 1024):
+    """Base64-encode image bytes straight into a JPEG data URI"""
+    prefix = b'data:image/jpeg;base64,'
+    source = memoryview(image_data)
+    
+    # Preallocate the whole URI and encode chunk by chunk into it (chunk_size is a
+    # multiple of 3 so no padding is emitted mid-stream)
+    buffer = bytearray(len(prefix) + (len(source) + 2) // 3 * 4)
+    buffer[:len(prefix)] = prefix
+    position = len(prefix)
+    for start in range(0, len(source), chunk_size):
+        encoded = pybase64.b64encode(source[start:start + chunk_size])
+        buffer[position:position + len(encoded)] = encoded
+        position += len(encoded)
+    
+    return str(memoryview(buffer), 'ascii')
 
 
-def analyze_image_with_ai(image_path):
-    """Analyze image using OpenAI Vision API with enhanced techniques"""
-    try:
-        print(f"Analyzing image: {image_path}")
-        
-        # Check if API key is available
-        if not openai.api_key:
-            raise ValueError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
-        
-        # Check if file exists
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
-        
-        # Encode image to base64
-        with open(image_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        print(f"Image encoded, size: {len(base64_image)} characters")
-        
-        # Enhanced prompt for better analysis
-        analysis_prompt = """You are an expert at identifying objects in images for creative reuse and upcycling.
+
+# Enhanced prompt for better analysis
+ANALYSIS_PROMPT = """You are an expert at identifying objects in images for creative reuse and upcycling.
 
 Look at this image carefully and provide a detailed analysis:
 
@@ -118,252 +350,336 @@ Look at this image carefully and provide a detailed analysis:
 7. **Creative Potential**: What makes this item suitable for creative reuse or DIY projects?
 
 Be very accurate and descriptive. If you see multiple items, focus on the main/primary item. Don't guess - only describe what you can clearly see."""
+
+# Batch variant - several images in one Vision request, one analysis per image
+BATCH_ANALYSIS_PROMPT = """You will be shown {count} images. Analyze EACH image on its own, following these instructions:
+
+""" + ANALYSIS_PROMPT + """
+
+Return one analysis per image in "analyses", in the same order as the images."""
+
+BATCH_ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "image_analyses",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "analyses": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["analyses"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+async def analyze_image_with_ai(image, detail='low', on_token=None, on_started=None):
+    """Analyze image using OpenAI Vision API with enhanced techniques
+    
+    `image` is either the processed JPEG bytes or a path to an image file. `detail`
+    is the Vision API detail level: 'low' costs a flat ~85 tokens per image, 'high'
+    tiles the image at ~170 tokens per 512px tile. If `on_token` is given the
+    response is streamed and each text delta is passed to it as it arrives.
+    `on_started` is called once the request holds an OpenAI slot and is sent.
+    """
+    try:
+        image_path = image if isinstance(image, str) else None
+        logger.debug("Analyzing image: %s", image_path or '<in-memory image>')
+        
+        # Check if API key is available
+        if not openai.api_key:
+            raise ValueError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
+        
+        if image_path:
+            # A missing file surfaces as FileNotFoundError from the read itself
+            image = await asyncio.get_running_loop().run_in_executor(io_executor, read_file, image_path)
+        
+        cache_key = f"{content_hash(image)}:{detail}"
+        cached_response = analysis_cache.get(cache_key)
+        if cached_response:
+            logger.debug("✅ Analysis cache hit: %s", cache_key)
+            if on_token:
+                on_token(cached_response)
+            return cached_response
+        
+        # Low detail only sees 512px, so don't upload more than that
+        if detail == 'low':
+            image = await asyncio.get_running_loop().run_in_executor(image_executor, downscale_image, image)
+        
+        # Encode image to a base64 data URI (pybase64 uses SIMD kernels where available)
+        image_data_uri = encode_image_data_uri(image)
+        
+        logger.debug("Image encoded, size: %d characters", len(image_data_uri))
         
         # Call OpenAI Vision API with enhanced settings
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text", 
-                            "text": analysis_prompt
-                        },
-                        {
-                            "type": "image_url", 
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                                "detail": "high"  # High detail for better analysis
+        async with openai_semaphore:
+            if on_started:
+                on_started()
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text", 
+                                "text": ANALYSIS_PROMPT
+                            },
+                            {
+                                "type": "image_url", 
+                                "image_url": {
+                                    "url": image_data_uri,
+                                    "detail": detail
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000,  # Increased tokens for detailed analysis
-            temperature=0.1,  # Low temperature for more consistent results
-        )
+                        ]
+                    }
+                ],
+                max_tokens=1000,  # Increased tokens for detailed analysis
+                temperature=0.1,  # Low temperature for more consistent results
+                stream=on_token is not None,
+            )
+            
+            if on_token:
+                chunks = []
+                async for chunk in response:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        chunks.append(delta)
+                        on_token(delta)
+                ai_response = ''.join(chunks)
+            else:
+                ai_response = response.choices[0].message.content
         
-        ai_response = response.choices[0].message.content
-        print(f"AI Response: {ai_response}")
+        logger.debug("AI Response: %s", ai_response)
+        # Only cache answers the retry logic would accept - a short or (low-detail)
+        # unclear answer must not be handed back to the next attempt
+        if ai_response and len(ai_response) > 50 and (detail == 'high' or 'unclear' not in ai_response.lower()):
+            analysis_cache.set(cache_key, ai_response)
         return ai_response
         
     except openai.APIError as e:
-        print(f"OpenAI API Error: {e}")
+        logger.error("OpenAI API Error: %s", e)
         if "quota" in str(e).lower() or "insufficient_quota" in str(e).lower():
-            print("⚠️ OpenAI quota exceeded. Using intelligent fallback analysis.")
+            logger.warning("⚠️ OpenAI quota exceeded. Using intelligent fallback analysis.")
             return None  # Return None to trigger fallback analysis
         else:
             raise Exception(f"AI analysis failed: {str(e)}")
     except FileNotFoundError as e:
-        print(f"File Error: {e}")
+        logger.error("File Error: %s", e)
         raise Exception(f"Image file not found: {str(e)}")
     except Exception as e:
-        print(f"Unexpected Error: {e}")
+        logger.error("Unexpected Error: %s", e)
         raise Exception(f"Analysis failed: {str(e)}")
 
-def generate_recommendations_with_ai(ai_analysis):
+async def analyze_batch_with_ai(images):
+    """Analyze several processed images (JPEG bytes) in a single low-detail Vision request
+    
+    Returns one analysis per image, in order, or None if the batch request fails so
+    the caller can fall back to analyzing the images one by one.
+    """
+    if not openai.api_key:
+        return None
+    
+    try:
+        loop = asyncio.get_running_loop()
+        small_images = await asyncio.gather(*(
+            loop.run_in_executor(image_executor, downscale_image, image) for image in images
+        ))
+        content = [{"type": "text", "text": BATCH_ANALYSIS_PROMPT.format(count=len(images))}]
+        content.extend(
+            {"type": "image_url", "image_url": {"url": encode_image_data_uri(image), "detail": "low"}}
+            for image in small_images
+        )
+        
+        async with openai_semaphore:
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": content}],
+                max_tokens=1000 * len(images),
+                temperature=0.1,
+                response_format=BATCH_ANALYSIS_RESPONSE_FORMAT,
+            )
+        
+        analyses = orjson.loads(response.choices[0].message.content)['analyses']
+        if len(analyses) != len(images):
+            logger.warning("Batch analysis returned %d analyses for %d images", len(analyses), len(images))
+            return None
+        return analyses
+        
+    except Exception as e:
+        logger.error("Batch analysis failed: %s", e)
+        return None
+
+async def generate_recommendations_with_ai(ai_analysis):
     """Generate recommendations using OpenAI based on AI analysis - NO STATIC FALLBACK"""
     try:
         if not openai.api_key:
-            print("⚠️ No API key, returning empty recommendations")
+            logger.warning("⚠️ No API key, returning empty recommendations")
             return get_empty_recommendations()
         
         if not ai_analysis or len(ai_analysis) < 50:
-            print("⚠️ Analysis too short, returning empty recommendations")
+            logger.warning("⚠️ Analysis too short, returning empty recommendations")
             return get_empty_recommendations()
         
-        # Create prompt for recommendations
-        recommendations_prompt = f"""Based on this detailed image analysis, generate SPECIFIC and ACTIONABLE recommendations for this exact item:
+        cache_key = content_hash(ai_analysis.encode('utf-8'))
+        cached_recommendations = recommendations_cache.get(cache_key)
+        if cached_recommendations:
+            logger.debug("✅ Recommendations cache hit: %s", cache_key)
+            return {key: list(items) for key, items in cached_recommendations.items()}
+        
+        # Create prompt for recommendations (kept compact - every prompt token is billed;
+        # the response shape is enforced by RECOMMENDATIONS_RESPONSE_FORMAT)
+        recommendations_prompt = f"""Based on this image analysis, give SPECIFIC and ACTIONABLE recommendations for this exact item:
 
 {ai_analysis}
 
-IMPORTANT: Provide EXACTLY 6 recommendations for each section. Format your response EXACTLY as shown below:
-
-### DIY Creative Ideas
-1. [First specific creative reuse idea for this exact item]
-2. [Second specific creative reuse idea]
-3. [Third specific creative reuse idea]
-4. [Fourth specific creative reuse idea]
-5. [Fifth specific creative reuse idea]
-6. [Sixth specific creative reuse idea]
-
-### Monetization Opportunities
-1. [First monetization method specific to this item]
-2. [Second monetization method]
-3. [Third monetization method]
-4. [Fourth monetization method]
-5. [Fifth monetization method]
-6. [Sixth monetization method]
-
-### Sustainability Benefits
-1. [First environmental benefit of reusing this specific item]
-2. [Second environmental benefit]
-3. [Third environmental benefit]
-4. [Fourth environmental benefit]
-5. [Fifth environmental benefit]
-6. [Sixth environmental benefit]
-
-### Helpful Tutorials
-1. [First tutorial topic relevant to this item]
-2. [Second tutorial topic]
-3. [Third tutorial topic]
-4. [Fourth tutorial topic]
-5. [Fifth tutorial topic]
-6. [Sixth tutorial topic]
-
-### Marketplace Suggestions
-1. [First marketplace with reason why it's good for this item]
-2. [Second marketplace with reason]
-3. [Third marketplace with reason]
-4. [Fourth marketplace with reason]
-5. [Fifth marketplace with reason]
-6. [Sixth marketplace with reason]
-
-CRITICAL: 
-- Be VERY specific to this exact item based on the analysis
-- Make recommendations practical, actionable, and realistic
-- Use numbered lists (1., 2., 3., etc.) exactly as shown
-- Each recommendation should be 1-2 sentences maximum
-- Focus on the actual item described in the analysis"""
+Give EXACTLY 6 recommendations for each of:
+- diy_ideas: creative reuse ideas
+- monetization: ways to make money from it
+- sustainability: environmental benefits of reusing it
+- tutorials: relevant tutorial topics
+- marketplace_suggestions: marketplace plus why it suits this item
+
+Be specific to this item, practical and realistic; 1-2 sentences per recommendation."""
         
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": recommendations_prompt
-                }
-            ],
-            max_tokens=2000,
-            temperature=0.8,  # Slightly higher for more creative recommendations
-        )
+        async with openai_semaphore:
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": recommendations_prompt
+                    }
+                ],
+                max_tokens=2000,
+                temperature=0.8,  # Slightly higher for more creative recommendations
+                response_format=RECOMMENDATIONS_RESPONSE_FORMAT,
+            )
         
         recommendations_text = response.choices[0].message.content
         
-        # Debug: Print AI response for troubleshooting
-        print(f"\n{'='*60}")
-        print(f"🤖 AI Recommendations Response:")
-        print(f"{'='*60}")
-        print(recommendations_text)  # Print full response
-        print(f"{'='*60}\n")
+        # Debug: Log AI response for troubleshooting
+        logger.debug("🤖 AI Recommendations Response:\n%s", recommendations_text)
         
-        # Parse the AI response
-        recommendations = parse_recommendations_from_text(recommendations_text)
+        # The schema guarantees the shape; still cap each section defensively
+        data = orjson.loads(recommendations_text)
+        recommendations = {
+            key: [item.strip() for item in data.get(key, [])[:MAX_SECTION_ITEMS] if item.strip()]
+            for key in RECOMMENDATION_SECTIONS
+        }
         
         # Debug: Check what we got
-        print(f"\n📋 Final Recommendations Summary:")
-        for key, items in recommendations.items():
-            print(f"  {key}: {len(items)} items")
-            if items:
-                print(f"    First item: {items[0][:60]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📋 Final Recommendations Summary:")
+            for key, items in recommendations.items():
+                logger.debug("  %s: %d items", key, len(items))
+                if items:
+                    logger.debug("    First item: %s...", items[0][:60])
         
         # If we got recommendations, return them
         if any(recommendations.values()):
-            print("✅ Successfully parsed AI-generated recommendations!")
+            logger.debug("✅ Successfully parsed AI-generated recommendations!")
+            recommendations_cache.set(cache_key, {key: list(items) for key, items in recommendations.items()})
             return recommendations
         else:
-            print("⚠️ Warning: No recommendations parsed, but returning empty (not using static fallback)")
+            logger.warning("⚠️ Warning: No recommendations parsed, but returning empty (not using static fallback)")
             return recommendations
         
     except Exception as e:
-        print(f"❌ AI recommendations generation failed: {e}")
-        print("⚠️ Returning empty recommendations (no static fallback)")
+        logger.error("❌ AI recommendations generation failed: %s", e)
+        logger.warning("⚠️ Returning empty recommendations (no static fallback)")
         return get_empty_recommendations()
 
-def parse_recommendations_from_text(text):
-    """Parse recommendations from AI-generated text"""
-    recommendations = {
-        'diy_ideas': [],
-        'monetization': [],
-        'sustainability': [],
-        'tutorials': [],
-        'marketplace_suggestions': []
-    }
-    
-    if not text:
-        print("⚠️ Empty text received for parsing")
-        return get_empty_recommendations()
-    
-    print(f"\n🔍 Parsing AI recommendations text (length: {len(text)} chars)")
-    print(f"First 200 chars: {text[:200]}...")
-    
-    lines = text.split('\n')
-    current_section = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        line_lower = line.lower()
-            
-        # Detect section headers (more flexible matching)
-        # Remove markdown headers (#) for matching
-        clean_line = line_lower.replace('#', '').strip()
-        
-        if ('diy' in clean_line and 'creative' in clean_line) or ('diy' in clean_line and 'idea' in clean_line):
-            current_section = 'diy_ideas'
-            print(f"📌 Found DIY section: {line}")
-            continue
-        elif 'monetization' in clean_line or 'monetisation' in clean_line or ('monet' in clean_line and 'opportunit' in clean_line):
-            current_section = 'monetization'
-            print(f"📌 Found Monetization section: {line}")
-            continue
-        elif 'sustainability' in clean_line or ('sustain' in clean_line and 'benefit' in clean_line):
-            current_section = 'sustainability'
-            print(f"📌 Found Sustainability section: {line}")
-            continue
-        elif ('tutorial' in clean_line or 'helpful' in clean_line) and ('tutorial' in clean_line or 'guide' in clean_line):
-            current_section = 'tutorials'
-            print(f"📌 Found Tutorials section: {line}")
-            continue
-        elif 'marketplace' in clean_line or ('market' in clean_line and 'suggest' in clean_line):
-            current_section = 'marketplace_suggestions'
-            print(f"📌 Found Marketplace section: {line}")
-            continue
-        
-        # Parse list items (more flexible patterns)
-        if current_section:
-            # Check for numbered lists (1., 2., etc.)
-            if len(line) > 0 and line[0].isdigit() and ('.' in line[:3] or ')' in line[:3]):
-                item = line.split('.', 1)[-1].split(')', 1)[-1].strip()
-                if item and len(recommendations[current_section]) < 6:
-                    recommendations[current_section].append(item)
-                    print(f"✅ Added to {current_section}: {item[:50]}...")
-            # Check for bullet points (-, *, •)
-            elif line.startswith(('-', '*', '•', '→', '▶')):
-                item = line.lstrip('-*•→▶ ').strip()
-                if item and len(recommendations[current_section]) < 6:
-                    recommendations[current_section].append(item)
-                    print(f"✅ Added to {current_section}: {item[:50]}...")
-            # Check for plain text lines after section header (if no numbering)
-            elif len(recommendations[current_section]) < 6 and len(line) > 10:
-                # Only add if it looks like a recommendation (not a header)
-                if not any(word in line_lower for word in ['###', '##', '#', 'section', 'category']):
-                    recommendations[current_section].append(line)
-                    print(f"✅ Added to {current_section}: {line[:50]}...")
-    
-    # Log what we parsed
-    print(f"📊 Parsed recommendations:")
-    for key, items in recommendations.items():
-        print(f"  {key}: {len(items)} items")
-    
-    # Ensure we have at least some recommendations
-    if not any(recommendations.values()):
-        print("⚠️ No recommendations parsed from AI response, returning empty")
-        return get_empty_recommendations()
-    
-    # Log what we got
-    for key in recommendations:
-        if recommendations[key] and len(recommendations[key]) > 0:
-            print(f"✅ {key}: {len(recommendations[key])} AI-generated recommendations")
-        else:
-            print(f"⚠️ {key}: Empty (no AI recommendations found)")
-    
-    return recommendations
+# Recommendation sections in display order and the number of items per section
+RECOMMENDATION_SECTIONS = ('diy_ideas', 'monetization', 'sustainability', 'tutorials', 'marketplace_suggestions')
+MAX_SECTION_ITEMS = 6
+
+# Structured output schema for generate_recommendations_with_ai - the model emits
+# the recommendations dict directly instead of free text we have to parse
+RECOMMENDATIONS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "recommendations",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                key: {
+                    "type": "array",
+                    "minItems": MAX_SECTION_ITEMS,
+                    "maxItems": MAX_SECTION_ITEMS,
+                    "items": {"type": "string"},
+                }
+                for key in RECOMMENDATION_SECTIONS
+            },
+            "required": list(RECOMMENDATION_SECTIONS),
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Keyword groups looked up in analysis text (plain substring matches)
+CHAIR_KEYWORDS = frozenset({'chair', 'stool', 'bench'})
+SEATING_KEYWORDS = CHAIR_KEYWORDS | {'seat'}
+TABLE_KEYWORDS = frozenset({'table', 'desk', 'counter'})
+SOFA_KEYWORDS = frozenset({'sofa', 'couch'})
+ELECTRONICS_KEYWORDS = frozenset({'electronic', 'phone', 'laptop', 'computer'})
+GLASS_KEYWORDS = frozenset({'glass', 'bottle', 'jar'})
+METAL_KEYWORDS = frozenset({'metal', 'steel', 'iron'})
+WOOD_KEYWORDS = frozenset({'wood', 'wooden'})
+VINTAGE_KEYWORDS = frozenset({'vintage', 'antique', 'rare'})
+COLLECTIBLE_KEYWORDS = VINTAGE_KEYWORDS | {'collectible'}
+DAMAGED_KEYWORDS = frozenset({'damaged', 'broken', 'worn'})
+DIY_HINT_KEYWORDS = frozenset({'diy', 'creative', 'transform'})
+SELLING_HINT_KEYWORDS = frozenset({'monetization', 'sell', 'marketplace'})
+REUSE_HINT_KEYWORDS = frozenset({'reuse', 'sustain', 'environment'})
+
+# Keyword groups used to pick the result category
+FURNITURE_KEYWORDS = CHAIR_KEYWORDS | {'table', 'sofa', 'furniture'}
+DEVICE_KEYWORDS = ELECTRONICS_KEYWORDS | {'device'}
+CLOTHING_KEYWORDS = frozenset({'shirt', 'dress', 'clothing', 'fabric', 'textile'})
+CONTAINER_KEYWORDS = GLASS_KEYWORDS | {'container'}
+TOOL_KEYWORDS = METAL_KEYWORDS | {'aluminum'}
+
+def build_keyword_automaton(keywords):
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+KEYWORD_AUTOMATON = build_keyword_automaton(
+    SEATING_KEYWORDS | TABLE_KEYWORDS | SOFA_KEYWORDS | ELECTRONICS_KEYWORDS | GLASS_KEYWORDS
+    | METAL_KEYWORDS | WOOD_KEYWORDS | COLLECTIBLE_KEYWORDS | DAMAGED_KEYWORDS
+    | DIY_HINT_KEYWORDS | SELLING_HINT_KEYWORDS | REUSE_HINT_KEYWORDS
+    | FURNITURE_KEYWORDS | DEVICE_KEYWORDS | CLOTHING_KEYWORDS | CONTAINER_KEYWORDS | TOOL_KEYWORDS
+)
+
+# Per-line cues used when salvaging recommendations straight from analysis text
+DIY_VERBS = ('transform', 'convert', 'create', 'make', 'repurpose')
+SELLING_CUES = ('sell', 'marketplace', 'ebay', 'facebook', 'etsy', 'craigslist')
+LIST_MARKERS = ('-', '*', '•', '1.', '2.', '3.')
+
+def find_keywords(text_lower):
+    """Return every known keyword occurring in the (lowercased) text in one Aho-Corasick pass"""
+    return {keyword for _, keyword in KEYWORD_AUTOMATON.iter(text_lower)}
+
+# Result categories in priority order - the first group with a keyword match wins
+CATEGORY_RULES = (
+    (FURNITURE_KEYWORDS, 'furniture'),
+    (DEVICE_KEYWORDS, 'electronics'),
+    (CLOTHING_KEYWORDS, 'clothing'),
+    (CONTAINER_KEYWORDS, 'kitchen'),
+    (TOOL_KEYWORDS, 'tools'),
+    (WOOD_KEYWORDS, 'furniture'),
+)
+
+def detect_category(text_lower):
+    """Pick the result category for the (lowercased) analysis text"""
+    keywords = find_keywords(text_lower)
+    return next((category for group, category in CATEGORY_RULES if keywords & group), 'general')
 
 def extract_recommendations_from_analysis(analysis_text):
     """Extract recommendations from analysis text if AI recommendations failed"""
@@ -378,16 +694,18 @@ def extract_recommendations_from_analysis(analysis_text):
     if not analysis_text:
         return get_empty_recommendations()
     
-    analysis_lower = analysis_text.lower()
+    keywords = find_keywords(analysis_text.lower())
+    
+    # Split and lowercase the analysis once for both line scans below
+    lines = analysis_text.split('\n')
+    lowered_lines = [line.lower().strip() for line in lines]
     
     # Extract DIY ideas from analysis
-    if 'diy' in analysis_lower or 'creative' in analysis_lower or 'transform' in analysis_lower:
+    if keywords & DIY_HINT_KEYWORDS:
         # Look for DIY ideas patterns
-        lines = analysis_text.split('\n')
-        for line in lines:
-            line_lower = line.lower().strip()
-            if any(word in line_lower for word in ['transform', 'convert', 'create', 'make', 'repurpose']) and len(line_lower) > 20:
-                if line_lower.startswith(('-', '*', '•', '1.', '2.', '3.')):
+        for line, line_lower in zip(lines, lowered_lines):
+            if len(line_lower) > 20 and any(word in line_lower for word in DIY_VERBS):
+                if line_lower.startswith(LIST_MARKERS):
                     clean_line = line.lstrip('-*•1234567890. ').strip()
                     if clean_line and len(recommendations['diy_ideas']) < 6:
                         recommendations['diy_ideas'].append(clean_line)
@@ -396,139 +714,48 @@ def extract_recommendations_from_analysis(analysis_text):
                         recommendations['diy_ideas'].append(line.strip())
     
     # Extract monetization from analysis
-    if 'monetization' in analysis_lower or 'sell' in analysis_lower or 'marketplace' in analysis_lower:
-        lines = analysis_text.split('\n')
-        for line in lines:
-            line_lower = line.lower().strip()
-            if any(word in line_lower for word in ['sell', 'marketplace', 'ebay', 'facebook', 'etsy', 'craigslist']) and len(line_lower) > 15:
+    if keywords & SELLING_HINT_KEYWORDS:
+        for line, line_lower in zip(lines, lowered_lines):
+            if len(line_lower) > 15 and any(word in line_lower for word in SELLING_CUES):
                 if not line_lower.startswith('**') and 'monetization' not in line_lower:
                     if len(recommendations['monetization']) < 6:
                         recommendations['monetization'].append(line.strip())
     
     # Generate sustainability benefits based on analysis
-    if 'reuse' in analysis_lower or 'sustain' in analysis_lower or 'environment' in analysis_lower:
-        recommendations['sustainability'] = [
-            "Reduces waste by reusing existing item",
-            "Decreases demand for new manufacturing",
-            "Supports circular economy principles",
-            "Reduces carbon footprint",
-            "Promotes sustainable consumption",
-            "Helps conserve natural resources"
-        ]
+    if keywords & REUSE_HINT_KEYWORDS:
+        recommendations['sustainability'] = SUSTAINABILITY_REUSE
     else:
-        recommendations['sustainability'] = [
-            "Reduces waste in landfills",
-            "Decreases manufacturing demand",
-            "Supports circular economy",
-            "Reduces carbon footprint",
-            "Promotes sustainable living",
-            "Conserves natural resources"
-        ]
+        recommendations['sustainability'] = SUSTAINABILITY_GENERAL
     
     # Generate tutorials based on material in analysis
-    if 'wood' in analysis_lower or 'wooden' in analysis_lower:
-        recommendations['tutorials'] = [
-            "Wood sanding and refinishing techniques",
-            "Wood staining and finishing methods",
-            "Basic wood repair techniques",
-            "Wood painting and decoration ideas",
-            "Wood assembly basics",
-            "Wood safety and tool handling"
-        ]
-    elif 'metal' in analysis_lower or 'steel' in analysis_lower:
-        recommendations['tutorials'] = [
-            "Metal cleaning and rust removal",
-            "Metal painting and finishing techniques",
-            "Basic metal repair methods",
-            "Metal cutting and shaping basics",
-            "Metal welding techniques",
-            "Metal safety and tool handling"
-        ]
-    elif 'glass' in analysis_lower:
-        recommendations['tutorials'] = [
-            "Glass cleaning and maintenance",
-            "Glass cutting and shaping techniques",
-            "Glass painting and decoration methods",
-            "Glass safety and handling basics",
-            "Glass repair and restoration",
-            "Glass crafting and DIY projects"
-        ]
-    else:
-        recommendations['tutorials'] = [
-            "Basic cleaning techniques",
-            "Safe handling methods",
-            "Restoration techniques",
-            "Creative painting ideas",
-            "Assembly basics",
-            "Safety guidelines"
-        ]
+    recommendations['tutorials'] = pick_tutorials(keywords, TUTORIAL_DISPATCH_BASIC)
     
     # Generate marketplace suggestions
-    recommendations['marketplace_suggestions'] = [
-        "Facebook Marketplace - Best for local sales",
-        "eBay - Wide audience reach",
-        "Craigslist - Quick local transactions",
-        "Etsy - Creative and handmade items",
-        "OfferUp - Mobile-friendly marketplace",
-        "Local thrift stores and consignment shops"
-    ]
+    recommendations['marketplace_suggestions'] = MARKETPLACE_SUGGESTIONS
     
     # If we still don't have DIY ideas, generate from analysis keywords
     if not recommendations['diy_ideas']:
-        if any(word in analysis_lower for word in ['chair', 'stool', 'bench']):
-            recommendations['diy_ideas'] = [
-                "Transform into a garden planter by adding soil and plants",
-                "Create unique wall art by painting and hanging",
-                "Convert into storage seating with hinged seat",
-                "Make a pet bed with cushions",
-                "Create a coat rack by adding hooks",
-                "Transform into a side table"
-            ]
-        elif any(word in analysis_lower for word in ['bottle', 'glass', 'jar']):
-            recommendations['diy_ideas'] = [
-                "Transform bottles into decorative vases",
-                "Create candle holders from glass containers",
-                "Make terrariums from jars",
-                "Create storage containers",
-                "Transform into hanging planters",
-                "Make decorative lamps"
-            ]
+        if keywords & CHAIR_KEYWORDS:
+            recommendations['diy_ideas'] = DIY_CHAIR_BASIC
+        elif keywords & GLASS_KEYWORDS:
+            recommendations['diy_ideas'] = DIY_GLASS_BASIC
         else:
-            recommendations['diy_ideas'] = [
-                "Transform into a decorative piece",
-                "Create a storage solution",
-                "Make it into a garden planter",
-                "Convert into wall art",
-                "Repurpose for pet use",
-                "Create a unique display item"
-            ]
+            recommendations['diy_ideas'] = DIY_GENERIC
     
     # If we still don't have monetization, generate from analysis
     if not recommendations['monetization']:
-        if any(word in analysis_lower for word in ['vintage', 'antique', 'rare']):
-            recommendations['monetization'] = [
-                "Sell to antique dealers or collectors",
-                "List on specialized vintage marketplaces",
-                "Try auction houses for valuable items",
-                "Post on Etsy for vintage items",
-                "Consider consignment shops",
-                "Sell to museums or collectors"
-            ]
+        if keywords & VINTAGE_KEYWORDS:
+            recommendations['monetization'] = MONETIZATION_VINTAGE
         else:
-            recommendations['monetization'] = [
-                "Sell on Facebook Marketplace",
-                "List on eBay",
-                "Post on Craigslist",
-                "Try local thrift stores",
-                "Consider consignment shops",
-                "Rent out for events"
-            ]
+            recommendations['monetization'] = MONETIZATION_GENERAL
     
-    print(f"📊 Extracted recommendations from analysis:")
-    for key, items in recommendations.items():
-        print(f"  {key}: {len(items)} items")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📊 Extracted recommendations from analysis:")
+        for key, items in recommendations.items():
+            logger.debug("  %s: %d items", key, len(items))
     
-    return recommendations
+    # Copy into lists so callers can't mutate the shared constants
+    return {key: list(items) for key, items in recommendations.items()}
 
 def get_empty_recommendations():
     """Return empty recommendations structure - no static fallback"""
@@ -540,267 +767,276 @@ def get_empty_recommendations():
         'marketplace_suggestions': []
     }
 
+# Static fallback recommendation lists (immutable, shared across calls)
+DIY_GENERIC = (
+    "Transform into a decorative piece",
+    "Create a storage solution",
+    "Make it into a garden planter",
+    "Convert into wall art",
+    "Repurpose for pet use",
+    "Create a unique display item"
+)
+DIY_SEATING = (
+    "Transform into a garden planter by adding soil and plants",
+    "Create a unique wall art piece by painting and hanging",
+    "Convert into a storage bench by adding a hinged seat",
+    "Make a pet bed by adding cushions and blankets",
+    "Create a coat rack by adding hooks to the back",
+    "Transform into a side table by adding a flat surface"
+)
+DIY_TABLE = (
+    "Convert into a workbench for DIY projects",
+    "Transform into a garden potting station",
+    "Create a storage unit by adding drawers",
+    "Make a display table for collectibles",
+    "Convert into a craft table for hobbies",
+    "Transform into a bar cart with wheels"
+)
+DIY_SOFA = (
+    "Reupholster with new fabric for a fresh look",
+    "Convert into a daybed by removing back cushions",
+    "Transform into outdoor seating with weather-resistant fabric",
+    "Create a pet bed by adding pet-friendly cushions",
+    "Convert into storage seating with hidden compartments",
+    "Transform into a reading nook with pillows"
+)
+DIY_ELECTRONICS = (
+    "Convert old phone into a security camera",
+    "Transform laptop screen into external monitor",
+    "Create Bluetooth speaker from old speakers",
+    "Build smart home controller from tablet",
+    "Make charging station from old electronics",
+    "Create LED lamp from circuit boards"
+)
+DIY_GLASS = (
+    "Transform bottles into decorative vases",
+    "Create candle holders from glass containers",
+    "Make terrariums from jars",
+    "Create storage containers for small items",
+    "Transform into hanging planters",
+    "Make decorative lamps from bottles"
+)
+DIY_METAL = (
+    "Create garden decorations from metal items",
+    "Transform into wall art with paint",
+    "Make storage containers from metal boxes",
+    "Create wind chimes from metal pieces",
+    "Transform into planters with proper drainage",
+    "Make decorative hooks and hangers"
+)
+DIY_WOOD = (
+    "Sand and refinish for a new look",
+    "Create wooden wall art or signs",
+    "Transform into garden planters",
+    "Make storage boxes or shelves",
+    "Create decorative wooden crafts",
+    "Transform into pet furniture"
+)
+MONETIZATION_GENERAL = (
+    "Sell on Facebook Marketplace",
+    "List on eBay",
+    "Post on Craigslist",
+    "Try local thrift stores",
+    "Consider consignment shops",
+    "Rent out for events"
+)
+MONETIZATION_VINTAGE = (
+    "Sell to antique dealers or collectors",
+    "List on specialized vintage marketplaces",
+    "Try auction houses for valuable items",
+    "Post on Etsy for vintage items",
+    "Consider consignment shops",
+    "Sell to museums or collectors"
+)
+MONETIZATION_DAMAGED = (
+    "Sell for parts or materials",
+    "List as 'for repair' on marketplaces",
+    "Sell to DIY enthusiasts",
+    "Offer for free to artists/crafters",
+    "Donate to art schools",
+    "Sell scrap materials"
+)
+SUSTAINABILITY_GENERAL = (
+    "Reduces waste in landfills",
+    "Decreases manufacturing demand",
+    "Supports circular economy",
+    "Reduces carbon footprint",
+    "Promotes sustainable living",
+    "Conserves natural resources"
+)
+SUSTAINABILITY_DETAILED = (
+    "Reduces waste in landfills significantly",
+    "Decreases demand for new item manufacturing",
+    "Supports circular economy principles",
+    "Reduces carbon footprint of production",
+    "Promotes sustainable consumption habits",
+    "Helps conserve natural resources"
+)
+TUTORIALS_GENERAL = (
+    "Basic cleaning techniques",
+    "Safe handling methods",
+    "Restoration techniques",
+    "Creative painting ideas",
+    "Assembly basics",
+    "Safety guidelines"
+)
+TUTORIALS_WOOD = (
+    "Wood sanding and refinishing techniques",
+    "Wood staining and finishing methods",
+    "Basic wood repair techniques",
+    "Wood painting and decoration ideas",
+    "Wood assembly and construction basics",
+    "Wood safety and tool handling"
+)
+TUTORIALS_METAL = (
+    "Metal cleaning and rust removal",
+    "Metal painting and finishing techniques",
+    "Basic metal repair methods",
+    "Metal cutting and shaping basics",
+    "Metal welding and joining techniques",
+    "Metal safety and tool handling"
+)
+TUTORIALS_GLASS = (
+    "Glass cleaning and maintenance",
+    "Glass cutting and shaping techniques",
+    "Glass painting and decoration methods",
+    "Glass safety and handling basics",
+    "Glass repair and restoration",
+    "Glass crafting and DIY projects"
+)
+MARKETPLACES = (
+    "Facebook Marketplace",
+    "eBay",
+    "Craigslist",
+    "Etsy",
+    "OfferUp",
+    "Local stores"
+)
+MARKETPLACE_SUGGESTIONS = (
+    "Facebook Marketplace - Best for local sales",
+    "eBay - Wide audience reach",
+    "Craigslist - Quick local transactions",
+    "Etsy - Creative and handmade items",
+    "OfferUp - Mobile-friendly marketplace",
+    "Local thrift stores and consignment shops"
+)
+SUSTAINABILITY_REUSE = (
+    "Reduces waste by reusing existing item",
+    "Decreases demand for new manufacturing",
+    "Supports circular economy principles",
+    "Reduces carbon footprint",
+    "Promotes sustainable consumption",
+    "Helps conserve natural resources"
+)
+TUTORIALS_WOOD_BASIC = (
+    "Wood sanding and refinishing techniques",
+    "Wood staining and finishing methods",
+    "Basic wood repair techniques",
+    "Wood painting and decoration ideas",
+    "Wood assembly basics",
+    "Wood safety and tool handling"
+)
+TUTORIALS_METAL_BASIC = (
+    "Metal cleaning and rust removal",
+    "Metal painting and finishing techniques",
+    "Basic metal repair methods",
+    "Metal cutting and shaping basics",
+    "Metal welding techniques",
+    "Metal safety and tool handling"
+)
+DIY_CHAIR_BASIC = (
+    "Transform into a garden planter by adding soil and plants",
+    "Create unique wall art by painting and hanging",
+    "Convert into storage seating with hinged seat",
+    "Make a pet bed with cushions",
+    "Create a coat rack by adding hooks",
+    "Transform into a side table"
+)
+DIY_GLASS_BASIC = (
+    "Transform bottles into decorative vases",
+    "Create candle holders from glass containers",
+    "Make terrariums from jars",
+    "Create storage containers",
+    "Transform into hanging planters",
+    "Make decorative lamps"
+)
+
+# Material -> tutorials, checked in order (wood before metal before glass)
+GLASS_MATERIAL_KEYWORDS = frozenset({'glass'})
+TUTORIAL_DISPATCH = (
+    (WOOD_KEYWORDS, TUTORIALS_WOOD),
+    (METAL_KEYWORDS, TUTORIALS_METAL),
+    (GLASS_MATERIAL_KEYWORDS, TUTORIALS_GLASS),
+)
+# Shorter variant used when salvaging recommendations from analysis text
+TUTORIAL_DISPATCH_BASIC = (
+    (WOOD_KEYWORDS, TUTORIALS_WOOD_BASIC),
+    (frozenset({'metal', 'steel'}), TUTORIALS_METAL_BASIC),
+    (GLASS_MATERIAL_KEYWORDS, TUTORIALS_GLASS),
+)
+
+def pick_tutorials(keywords, dispatch):
+    """First tutorial list whose material keywords were found, else the general one"""
+    return next((tutorials for group, tutorials in dispatch if keywords & group), TUTORIALS_GENERAL)
+
 def generate_recommendations(ai_analysis):
     """Generate intelligent recommendations based on AI analysis (Fallback static method)"""
-    recommendations = {
-        'diy_ideas': [],
-        'monetization': [],
-        'sustainability': [],
-        'tutorials': [],
-        'marketplace_suggestions': []
-    }
-    
     if not ai_analysis:
         # Default recommendations if no analysis
         recommendations = {
-            'diy_ideas': [
-                "Transform into a decorative piece",
-                "Create a storage solution",
-                "Make it into a garden planter",
-                "Convert into wall art",
-                "Repurpose for pet use",
-                "Create a unique display item"
-            ],
-            'monetization': [
-                "Sell on Facebook Marketplace",
-                "List on eBay",
-                "Post on Craigslist",
-                "Try local thrift stores",
-                "Consider consignment shops",
-                "Rent out for events"
-            ],
-            'sustainability': [
-                "Reduces waste in landfills",
-                "Decreases manufacturing demand",
-                "Supports circular economy",
-                "Reduces carbon footprint",
-                "Promotes sustainable living",
-                "Conserves natural resources"
-            ],
-            'tutorials': [
-                "Basic cleaning techniques",
-                "Safe handling methods",
-                "Restoration techniques",
-                "Creative painting ideas",
-                "Assembly basics",
-                "Safety guidelines"
-            ],
-            'marketplace_suggestions': [
-                "Facebook Marketplace",
-                "eBay",
-                "Craigslist",
-                "Etsy",
-                "OfferUp",
-                "Local stores"
-            ]
+            'diy_ideas': DIY_GENERIC,
+            'monetization': MONETIZATION_GENERAL,
+            'sustainability': SUSTAINABILITY_GENERAL,
+            'tutorials': TUTORIALS_GENERAL,
+            'marketplace_suggestions': MARKETPLACES
         }
-        return recommendations
+        return {key: list(items) for key, items in recommendations.items()}
     
     # Analyze the AI response to generate specific recommendations
-    analysis_lower = ai_analysis.lower()
+    keywords = find_keywords(ai_analysis.lower())
+    recommendations = {}
     
     # Generate specific DIY ideas based on what AI found
-    if any(word in analysis_lower for word in ['chair', 'stool', 'bench', 'seat']):
-        recommendations['diy_ideas'] = [
-            "Transform into a garden planter by adding soil and plants",
-            "Create a unique wall art piece by painting and hanging",
-            "Convert into a storage bench by adding a hinged seat",
-            "Make a pet bed by adding cushions and blankets",
-            "Create a coat rack by adding hooks to the back",
-            "Transform into a side table by adding a flat surface"
-        ]
-    elif any(word in analysis_lower for word in ['table', 'desk', 'counter']):
-        recommendations['diy_ideas'] = [
-            "Convert into a workbench for DIY projects",
-            "Transform into a garden potting station",
-            "Create a storage unit by adding drawers",
-            "Make a display table for collectibles",
-            "Convert into a craft table for hobbies",
-            "Transform into a bar cart with wheels"
-        ]
-    elif any(word in analysis_lower for word in ['sofa', 'couch']):
-        recommendations['diy_ideas'] = [
-            "Reupholster with new fabric for a fresh look",
-            "Convert into a daybed by removing back cushions",
-            "Transform into outdoor seating with weather-resistant fabric",
-            "Create a pet bed by adding pet-friendly cushions",
-            "Convert into storage seating with hidden compartments",
-            "Transform into a reading nook with pillows"
-        ]
-    elif any(word in analysis_lower for word in ['electronic', 'phone', 'laptop', 'computer']):
-        recommendations['diy_ideas'] = [
-            "Convert old phone into a security camera",
-            "Transform laptop screen into external monitor",
-            "Create Bluetooth speaker from old speakers",
-            "Build smart home controller from tablet",
-            "Make charging station from old electronics",
-            "Create LED lamp from circuit boards"
-        ]
-    elif any(word in analysis_lower for word in ['glass', 'bottle', 'jar']):
-        recommendations['diy_ideas'] = [
-            "Transform bottles into decorative vases",
-            "Create candle holders from glass containers",
-            "Make terrariums from jars",
-            "Create storage containers for small items",
-            "Transform into hanging planters",
-            "Make decorative lamps from bottles"
-        ]
-    elif any(word in analysis_lower for word in ['metal', 'steel', 'iron']):
-        recommendations['diy_ideas'] = [
-            "Create garden decorations from metal items",
-            "Transform into wall art with paint",
-            "Make storage containers from metal boxes",
-            "Create wind chimes from metal pieces",
-            "Transform into planters with proper drainage",
-            "Make decorative hooks and hangers"
-        ]
-    elif any(word in analysis_lower for word in ['wood', 'wooden']):
-        recommendations['diy_ideas'] = [
-            "Sand and refinish for a new look",
-            "Create wooden wall art or signs",
-            "Transform into garden planters",
-            "Make storage boxes or shelves",
-            "Create decorative wooden crafts",
-            "Transform into pet furniture"
-        ]
+    if keywords & SEATING_KEYWORDS:
+        recommendations['diy_ideas'] = DIY_SEATING
+    elif keywords & TABLE_KEYWORDS:
+        recommendations['diy_ideas'] = DIY_TABLE
+    elif keywords & SOFA_KEYWORDS:
+        recommendations['diy_ideas'] = DIY_SOFA
+    elif keywords & ELECTRONICS_KEYWORDS:
+        recommendations['diy_ideas'] = DIY_ELECTRONICS
+    elif keywords & GLASS_KEYWORDS:
+        recommendations['diy_ideas'] = DIY_GLASS
+    elif keywords & METAL_KEYWORDS:
+        recommendations['diy_ideas'] = DIY_METAL
+    elif keywords & WOOD_KEYWORDS:
+        recommendations['diy_ideas'] = DIY_WOOD
     else:
         # Generic recommendations for other items
-        recommendations['diy_ideas'] = [
-            "Transform into a decorative piece",
-            "Create a storage solution",
-            "Make it into a garden planter",
-            "Convert into wall art",
-            "Repurpose for pet use",
-            "Create a unique display item"
-        ]
+        recommendations['diy_ideas'] = DIY_GENERIC
     
     # Generate monetization suggestions based on condition and type
-    if any(word in analysis_lower for word in ['vintage', 'antique', 'rare', 'collectible']):
-        recommendations['monetization'] = [
-            "Sell to antique dealers or collectors",
-            "List on specialized vintage marketplaces",
-            "Try auction houses for valuable items",
-            "Post on Etsy for vintage items",
-            "Consider consignment shops",
-            "Sell to museums or collectors"
-        ]
-    elif any(word in analysis_lower for word in ['damaged', 'broken', 'worn']):
-        recommendations['monetization'] = [
-            "Sell for parts or materials",
-            "List as 'for repair' on marketplaces",
-            "Sell to DIY enthusiasts",
-            "Offer for free to artists/crafters",
-            "Donate to art schools",
-            "Sell scrap materials"
-        ]
+    if keywords & COLLECTIBLE_KEYWORDS:
+        recommendations['monetization'] = MONETIZATION_VINTAGE
+    elif keywords & DAMAGED_KEYWORDS:
+        recommendations['monetization'] = MONETIZATION_DAMAGED
     else:
-        recommendations['monetization'] = [
-            "Sell on Facebook Marketplace",
-            "List on eBay",
-            "Post on Craigslist",
-            "Try local thrift stores",
-            "Consider consignment shops",
-            "Rent out for events"
-        ]
+        recommendations['monetization'] = MONETIZATION_GENERAL
     
     # Generate sustainability benefits
-    recommendations['sustainability'] = [
-        "Reduces waste in landfills significantly",
-        "Decreases demand for new item manufacturing",
-        "Supports circular economy principles",
-        "Reduces carbon footprint of production",
-        "Promotes sustainable consumption habits",
-        "Helps conserve natural resources"
-    ]
+    recommendations['sustainability'] = SUSTAINABILITY_DETAILED
     
     # Generate tutorials based on material
-    if any(word in analysis_lower for word in ['wood', 'wooden']):
-        recommendations['tutorials'] = [
-            "Wood sanding and refinishing techniques",
-            "Wood staining and finishing methods",
-            "Basic wood repair techniques",
-            "Wood painting and decoration ideas",
-            "Wood assembly and construction basics",
-            "Wood safety and tool handling"
-        ]
-    elif any(word in analysis_lower for word in ['metal', 'steel', 'iron']):
-        recommendations['tutorials'] = [
-            "Metal cleaning and rust removal",
-            "Metal painting and finishing techniques",
-            "Basic metal repair methods",
-            "Metal cutting and shaping basics",
-            "Metal welding and joining techniques",
-            "Metal safety and tool handling"
-        ]
-    elif any(word in analysis_lower for word in ['glass']):
-        recommendations['tutorials'] = [
-            "Glass cleaning and maintenance",
-            "Glass cutting and shaping techniques",
-            "Glass painting and decoration methods",
-            "Glass safety and handling basics",
-            "Glass repair and restoration",
-            "Glass crafting and DIY projects"
-        ]
-    else:
-        recommendations['tutorials'] = [
-            "Basic cleaning techniques",
-            "Safe handling methods",
-            "Restoration techniques",
-            "Creative painting ideas",
-            "Assembly basics",
-            "Safety guidelines"
-        ]
+    recommendations['tutorials'] = pick_tutorials(keywords, TUTORIAL_DISPATCH)
     
     # Generate marketplace suggestions
-    recommendations['marketplace_suggestions'] = [
-        "Facebook Marketplace - Best for local sales",
-        "eBay - Wide audience reach",
-        "Craigslist - Quick local transactions",
-        "Etsy - Creative and handmade items",
-        "OfferUp - Mobile-friendly marketplace",
-        "Local thrift stores and consignment shops"
-    ]
+    recommendations['marketplace_suggestions'] = MARKETPLACE_SUGGESTIONS
     
-    return recommendations
-
+    # Hand out fresh lists so callers can't mutate the shared constants
+    return {key: list(items) for key, items in recommendations.items()}
 
-def analyze_image(image_path):
-    """Analyze image using OpenAI Vision API with multiple attempts"""
-    try:
-        print(f"Starting analysis for: {image_path}")
-        
-        # Process the image first
-        processed_path = process_image(image_path)
-        print(f"Image processed: {processed_path}")
-        
-        # Get image information
-        image_info = get_image_info(processed_path)
-        
-        # Try AI analysis with multiple attempts
-        ai_response = None
-        max_attempts = 3
-        
-        for attempt in range(max_attempts):
-            print(f"Attempt {attempt + 1}/{max_attempts}")
-            ai_response = analyze_image_with_ai(processed_path)
-            
-            if ai_response and len(ai_response) > 50:  # Check if we got a meaningful response
-                print(f"Analysis successful on attempt {attempt + 1}")
-                break
-            else:
-                print(f"Attempt {attempt + 1} failed or returned short response")
-                if attempt < max_attempts - 1:
-                    print("Retrying...")
-        
-        if not ai_response or len(ai_response) < 50:
-            print("All AI attempts failed, using intelligent fallback analysis")
-            # Intelligent fallback analysis based on filename and image info
-            filename = os.path.basename(image_path).lower()
-            image_info = get_image_info(processed_path)
-            
-            # Generate intelligent analysis based on filename patterns
-            if any(word in filename for word in ['chair', 'stool', 'bench']):
-                ai_response = """**Object Identification**: This appears to be a chair or seating furniture.
+# Canned analyses used when every AI attempt fails, picked by file name
+FALLBACK_CHAIR = """**Object Identification**: This appears to be a chair or seating furniture.
 
 **Material Analysis**: Likely made of wood, metal, or a combination of materials.
 
@@ -820,9 +1056,8 @@ def analyze_image(image_path):
 - Create decorative display piece
 
 **Monetization**: Can be sold on Facebook Marketplace, eBay, or local thrift stores."""
-            
-            elif any(word in filename for word in ['bottle', 'glass', 'jar']):
-                ai_response = """**Object Identification**: This appears to be a glass bottle or container.
+
+FALLBACK_BOTTLE = """**Object Identification**: This appears to be a glass bottle or container.
 
 **Material Analysis**: Made of glass, suitable for various creative projects.
 
@@ -840,9 +1075,8 @@ def analyze_image(image_path):
 - Transform into hanging planters
 
 **Monetization**: Can be sold as craft supplies or decorative items."""
-            
-            else:
-                ai_response = """**Object Identification**: This appears to be a household item with creative potential.
+
+FALLBACK_GENERIC = """**Object Identification**: This appears to be a household item with creative potential.
 
 **Material Analysis**: The item seems to be made of common household materials suitable for reuse.
 
@@ -858,59 +1092,375 @@ def analyze_image(image_path):
 - Repurpose for pet use
 
 **Monetization**: Can be sold on various online marketplaces or local stores."""
+
+# Checked in order, so chair-like names win over bottle-like ones
+FALLBACK_TABLE = {
+    'chair': FALLBACK_CHAIR,
+    'stool': FALLBACK_CHAIR,
+    'bench': FALLBACK_CHAIR,
+    'bottle': FALLBACK_BOTTLE,
+    'glass': FALLBACK_BOTTLE,
+    'jar': FALLBACK_BOTTLE,
+}
+
+# Seconds a vision attempt may hold an OpenAI slot without streaming its first
+# token before it is hedged with another one. Time spent queued for a slot doesn't
+# count, and a full answer takes far longer than its first token, so this tracks
+# time-to-first-token rather than completion time
+HEDGE_DELAY = 4.0
+
+async def analyze_with_hedging(image, max_attempts=3, hedge_delay=HEDGE_DELAY, on_token=None):
+    """Run vision attempts as hedged requests and return the first meaningful answer
+    
+    The first attempt is a cheap low-detail pass. A high-detail attempt is started
+    as soon as an attempt fails or comes back short/unclear, or when the newest
+    attempt has held an OpenAI slot for `hedge_delay` seconds without streaming a
+    token; whichever good answer lands first wins and the others are cancelled.
+    No time-based hedge is started while every OpenAI slot is busy, since it would
+    only queue behind the attempt it is meant to overtake. 429/5xx backoff is left
+    to the client's own retries (max_retries). `on_token` streams the first attempt
+    only, so hedged attempts never interleave their text.
+    """
+    loop = asyncio.get_running_loop()
+    details = {}  # in-flight task -> detail level
+    started = 0
+    ai_response = None
+    error = None
+    stalled = asyncio.Event()  # newest attempt went hedge_delay without a token
+    hedge_timer = None
+    
+    def start_attempt(detail):
+        nonlocal started, hedge_timer
+        started += 1
+        number = started
+        logger.debug("Attempt %d/%d (detail: %s)", number, max_attempts, detail)
+        if hedge_timer:
+            hedge_timer.cancel()
+            hedge_timer = None
+        
+        def on_started():
+            nonlocal hedge_timer
+            if number == started and started < max_attempts:
+                hedge_timer = loop.call_later(hedge_delay, stalled.set)
+        
+        def on_attempt_token(text):
+            nonlocal hedge_timer
+            if number == started and hedge_timer:
+                hedge_timer.cancel()
+                hedge_timer = None
+            if number == 1 and on_token:
+                on_token(text)
+        
+        attempt = analyze_image_with_ai(image, detail=detail, on_token=on_attempt_token, on_started=on_started)
+        details[asyncio.ensure_future(attempt)] = detail
+    
+    start_attempt('low')
+    stall = asyncio.ensure_future(stalled.wait())
+    try:
+        while details:
+            done, _ = await asyncio.wait([*details, stall], return_when=asyncio.FIRST_COMPLETED)
+            if stall in done:
+                done.discard(stall)
+                stalled.clear()
+                stall = asyncio.ensure_future(stalled.wait())
+                if openai_semaphore.locked():
+                    logger.debug("No token after %ss, but OpenAI slots are saturated - not hedging", hedge_delay)
+                else:
+                    logger.debug("No token after %ss, starting a hedged attempt", hedge_delay)
+                    start_attempt('high')
+            
+            for task in done:
+                detail = details.pop(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    error = e
+                    response = None
+                
+                if response and len(response) > 50:  # Check if we got a meaningful response
+                    ai_response = response
+                    if detail == 'high' or 'unclear' not in response.lower():
+                        logger.debug("Analysis successful")
+                        return response
+                    logger.debug("Low-detail answer was unclear")
+                else:
+                    logger.debug("Attempt failed or returned short response")
+                
+                if started < max_attempts:
+                    logger.debug("Retrying...")
+                    start_attempt('high')
+    finally:
+        if hedge_timer:
+            hedge_timer.cancel()
+        stall.cancel()
+        for task in details:
+            task.cancel()
+    
+    # Every attempt failed - surface the error unless an (unclear) answer came back
+    if ai_response is None and error is not None:
+        raise error
+    return ai_response
+
+def make_result(analysis, category, confidence, recommendations, original_image, processed_image, image_info, degraded=False):
+    """Build the analysis result dict - every path returns exactly this shape
+    
+    `degraded` marks results that used a fallback (or failed) instead of genuine
+    AI output, so they are not reused.
+    """
+    return {
+        'analysis': analysis,
+        'category': category,
+        'confidence': confidence,
+        'recommendations': recommendations,
+        'timestamp': iso_now(),
+        'original_image': original_image,
+        'processed_image': processed_image,
+        'image_info': image_info,
+        'degraded': degraded
+    }
+
+async def analyze_image_async(image, filename_hint=None, on_token=None, processed=None, ai_response=None):
+    """Analyze image using OpenAI Vision API with multiple attempts (process -> vision -> recommendations)
+    
+    `image` is a path or the raw encoded image bytes; `filename_hint` (the original
+    file name) takes precedence over the path's name in the fallback analysis. Batch callers pass
+    the already `processed` image and its `ai_response`; the vision step only runs
+    if that response is missing or too short, and an unclear one is retried at
+    high detail.
+    """
+    image_path = image if isinstance(image, str) else None
+    try:
+        logger.debug("Starting analysis for: %s", image_path or filename_hint)
+        
+        # Process the image first
+        if processed is None:
+            processed = await asyncio.get_running_loop().run_in_executor(image_executor, process_image, image)
+        processed_path = processed['path']
+        logger.debug("Image processed: %s", processed_path)
+        
+        # Get image information
+        image_info = processed['info']
+        
+        # Identical processed bytes mean an identical analysis - skip the AI calls
+        result_key = processed['hash']
+        cached_result = result_cache.get(result_key) if result_key else None
+        if cached_result:
+            logger.debug("✅ Result cache hit: %s", result_key)
+            ai_response, recommendations, category, image_info = cached_result
+            if processed['saved']:
+                await asyncio.wrap_future(processed['saved'])
+            return make_result(
+                ai_response,
+                category,
+                90 if ai_response and len(ai_response) > 100 else 60,
+                {key: list(items) for key, items in recommendations.items()},
+                image_path,
+                processed_path,
+                image_info
+            )
+        
+        # Try AI analysis with hedged attempts - start with a cheap low-detail pass
+        # and only escalate to high detail if that is slow, short or unclear
+        if not ai_response or len(ai_response) <= 50:
+            ai_response = await analyze_with_hedging(processed['data'] or processed_path, on_token=on_token)
+        elif 'unclear' in ai_response.lower():
+            # An unclear low-detail batch answer escalates to high detail like a
+            # single-image attempt would; keep it if the high-detail pass fails
+            try:
+                ai_response = await analyze_image_with_ai(processed['data'] or processed_path, detail='high') or ai_response
+            except Exception as e:
+                logger.warning("High-detail attempt failed, keeping the batch answer: %s", e)
+        
+        used_fallback = not ai_response or len(ai_response) < 50
+        if used_fallback:
+            logger.warning("All AI attempts failed, using intelligent fallback analysis")
+            # Intelligent fallback analysis based on filename and image info
+            filename = os.path.basename(filename_hint or image_path or '').lower()
             
-            print("✅ Fallback analysis generated successfully")
+            # Generate intelligent analysis based on filename patterns
+            ai_response = next(
+                (analysis for word, analysis in FALLBACK_TABLE.items() if word in filename),
+                FALLBACK_GENERIC
+            )
+            
+            logger.debug("✅ Fallback analysis generated successfully")
         
         # Generate recommendations using AI
-        recommendations = generate_recommendations_with_ai(ai_response)
+        recommendations = await generate_recommendations_with_ai(ai_response)
         
         # If AI recommendations are empty, try to extract from analysis text
-        if not any(recommendations.values()):
-            print("⚠️ AI recommendations empty, extracting from analysis text...")
+        ai_recommendations = any(recommendations.values())
+        if not ai_recommendations:
+            logger.warning("⚠️ AI recommendations empty, extracting from analysis text...")
             recommendations = extract_recommendations_from_analysis(ai_response)
         
         # Determine category
-        analysis_lower = ai_response.lower()
-        if any(word in analysis_lower for word in ['chair', 'table', 'sofa', 'furniture', 'stool', 'bench']):
-            category = "furniture"
-        elif any(word in analysis_lower for word in ['phone', 'laptop', 'electronic', 'computer', 'device']):
-            category = "electronics"
-        elif any(word in analysis_lower for word in ['shirt', 'dress', 'clothing', 'fabric', 'textile']):
-            category = "clothing"
-        elif any(word in analysis_lower for word in ['glass', 'bottle', 'jar', 'container']):
-            category = "kitchen"
-        elif any(word in analysis_lower for word in ['metal', 'steel', 'iron', 'aluminum']):
-            category = "tools"
-        elif any(word in analysis_lower for word in ['wood', 'wooden']):
-            category = "furniture"
-        else:
-            category = "general"
+        category = detect_category(ai_response.lower())
         
-        return {
-            'analysis': ai_response,
-            'category': category,
-            'confidence': 90 if ai_response and len(ai_response) > 100 else 60,
-            'recommendations': recommendations,
-            'timestamp': datetime.now().isoformat(),
-            'original_image': image_path,
-            'processed_image': processed_path,
-            'image_info': image_info
-        }
+        # Only cache genuine AI results - a fallback analysis or extracted
+        # recommendations should be retried next time
+        if result_key and not used_fallback and ai_recommendations:
+            result_cache.set(result_key, (
+                ai_response,
+                {key: list(items) for key, items in recommendations.items()},
+                category,
+                image_info
+            ))
+        
+        # Make sure the preview exists before the results page links to it
+        if processed['saved']:
+            await asyncio.wrap_future(processed['saved'])
+        
+        return make_result(
+            ai_response,
+            category,
+            90 if ai_response and len(ai_response) > 100 else 60,
+            recommendations,
+            image_path,
+            processed_path,
+            image_info,
+            degraded=used_fallback or not ai_recommendations
+        )
         
     except Exception as e:
-        print(f"Analysis Error: {e}")
-        return {
-            'analysis': f'Analysis failed: {str(e)}',
-            'category': 'error',
-            'confidence': 0,
-            'recommendations': get_empty_recommendations(),
-            'timestamp': datetime.now().isoformat(),
-            'original_image': image_path,
-            'processed_image': image_path,
-            'image_info': None
-        }
+        logger.error("Analysis Error: %s", e)
+        return make_result(
+            f'Analysis failed: {str(e)}',
+            'error',
+            0,
+            get_empty_recommendations(),
+            image_path,
+            image_path,
+            None,
+            degraded=True
+        )
+
+def analyze_image(image_path):
+    """Analyze a single image (blocking wrapper around analyze_image_async)"""
+    return run_async(analyze_image_async(image_path))
+
+def analyze_image_bytes(buf, filename_hint):
+    """Analyze an in-memory image without writing the original to disk"""
+    return run_async(analyze_image_async(buf, filename_hint))
+
+async def analyze_images_batch_async(image_paths):
+    """Analyze several images with one Vision request; results are returned in input order.
+    
+    Images are processed in parallel, then every image without a cached result goes
+    into a single batch Vision request. Recommendations still run per image,
+    concurrently. Images the batch couldn't answer (or the whole batch, if the
+    request fails) fall back to the regular per-image vision attempts, and unclear
+    batch answers are escalated to high detail one by one.
+    """
+    loop = asyncio.get_running_loop()
+    processed_images = await asyncio.gather(*(
+        loop.run_in_executor(image_executor, process_image, path) for path in image_paths
+    ))
+    
+    # Cached images and images that failed processing are left to the per-image path
+    ai_responses = [None] * len(image_paths)
+    pending = [
+        index for index, processed in enumerate(processed_images)
+        if processed['hash'] and processed['hash'] not in result_cache
+    ]
+    if len(pending) > 1:
+        analyses = await analyze_batch_with_ai([processed_images[index]['data'] for index in pending])
+        if analyses:
+            for index, analysis in zip(pending, analyses):
+                ai_responses[index] = analysis
+    
+    return await asyncio.gather(*(
+        analyze_image_async(path, processed=processed, ai_response=ai_response)
+        for path, processed, ai_response in zip(image_paths, processed_images, ai_responses)
+    ))
+
+def analyze_images_batch(image_paths):
+    """Analyze several images (blocking wrapper around analyze_images_batch_async)"""
+    return run_async(analyze_images_batch_async(image_paths))
+
+def stream_analyze_image(image, filename_hint=None):
+    """Analyze a single image (path or bytes), yielding ('token', text) while the
+    vision answer streams in and finally ('result', analysis)"""
+    events = queue.Queue()
+    
+    async def analyze_and_finish():
+        try:
+            on_token = lambda text: events.put(('token', text))
+            events.put(('result', await analyze_image_async(image, filename_hint, on_token)))
+        finally:
+            events.put(None)
+    
+    asyncio.run_coroutine_threadsafe(analyze_and_finish(), event_loop)
+    while (event := events.get()) is not None:
+        yield event
+
+# Background analysis jobs - /upload hands the work to the shared event loop and
+# returns straight away. Finished results are kept for an hour; running jobs are
+# never evicted, so a results page that is still polling can't lose its job
+JOB_TTL = 60 * 60
+analysis_jobs = {}  # job id -> (expires_at, job); expires_at is None while running
+analysis_jobs_lock = threading.Lock()
+
+def get_analysis_job(job_id):
+    """Return a job's status dict, or None if it is unknown or has expired"""
+    with analysis_jobs_lock:
+        entry = analysis_jobs.get(job_id)
+        if entry is None:
+            return None
+        expires_at, job = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del analysis_jobs[job_id]
+            return None
+        return job
+
+def set_analysis_job(job_id, job):
+    """Store a job's status, sweeping out finished jobs past their TTL"""
+    now = time.monotonic()
+    with analysis_jobs_lock:
+        expired = [
+            key for key, (expires_at, _) in analysis_jobs.items()
+            if expires_at is not None and expires_at < now
+        ]
+        for key in expired:
+            del analysis_jobs[key]
+        analysis_jobs[job_id] = (now + JOB_TTL if job['status'] == 'done' else None, job)
+
+def submit_analysis_job(image_path, job_id=None, filename_hint=None):
+    """Start analyzing an image in the background and return its job id
+    
+    If a job with the given id is still running or finished with a genuine AI result
+    it is reused instead of analyzing the image again; errors and fallback results
+    are retried.
+    """
+    if job_id is None:
+        job_id = secrets.token_hex(16)
+    else:
+        job = get_analysis_job(job_id)
+        if job is not None and (job['status'] != 'done' or not job['degraded']):
+            return job_id
+    
+    set_analysis_job(job_id, {'status': 'pending'})
+    
+    async def run_job():
+        analysis = await analyze_image_async(image_path, filename_hint)
+        set_analysis_job(job_id, {'status': 'done', 'result': analysis, 'degraded': analysis['degraded']})
+    
+    asyncio.run_coroutine_threadsafe(run_job(), event_loop)
+    return job_id
 
 # Routes
+@app.errorhandler(413)
+def request_entity_too_large(e):
+    """Uploads over MAX_CONTENT_LENGTH are rejected by Werkzeug before the body is read"""
+    max_length = request.max_content_length or app.config['MAX_CONTENT_LENGTH']
+    message = f'File too large. Maximum size allowed is {max_length // (1024*1024)}MB.'
+    
+    # The upload form gets a flash message; API and fetch() callers get JSON they can show
+    if request.endpoint == 'upload_file':
+        flash(message, 'error')
+        return redirect(url_for('index'))
+    return jsonify({'error': message}), 413
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -935,32 +1485,52 @@ def upload_file():
             flash('Invalid file type. Please upload PNG, JPG, JPEG, GIF, or WEBP files only.', 'error')
             return redirect(url_for('index'))
         
-        # Check file size
-        file.seek(0, 2)  # Seek to end
-        file_size = file.tell()
-        file.seek(0)  # Reset to beginning
+        # Save under the content hash - a re-upload of the same image reuses the file
+        # and, while it is still kept, the finished (or running) analysis job
+        data = file.read()
+        upload_hash = content_hash(data)
+        ext = file.filename.rsplit('.', 1)[1].lower()
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{upload_hash}.{ext}")
+        write_file_once(filepath, data)
         
-        if file_size > app.config['MAX_CONTENT_LENGTH']:
-            flash(f'File too large. Maximum size allowed is {app.config["MAX_CONTENT_LENGTH"] // (1024*1024)}MB.', 'error')
-            return redirect(url_for('index'))
-        
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Analyze the image
-        try:
-            analysis = analyze_image(filepath)
-            flash('Image analyzed successfully!', 'success')
-            return render_template('results.html', analysis=analysis)
-        except Exception as e:
-            flash(f'Analysis failed: {str(e)}', 'error')
-            return redirect(url_for('index'))
+        # Analyze the image in the background - the results page polls until it's ready
+        job_id = submit_analysis_job(filepath, upload_hash, secure_filename(file.filename))
+        return redirect(url_for('job_results', job_id=job_id))
             
+    except RequestEntityTooLarge:
+        raise  # Handled by request_entity_too_large
     except Exception as e:
         flash(f'Upload failed: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+@app.route('/results/<job_id>')
+def job_results(job_id):
+    """Results page for a background analysis; shows a polling page until it's done"""
+    job = get_analysis_job(job_id)
+    if job is None:
+        flash('Analysis not found or expired. Please upload your image again.', 'error')
+        return redirect(url_for('index'))
+    
+    if job['status'] != 'done':
+        return render_template('analyzing.html', job_id=job_id)
+    
+    return render_template('results.html', analysis=job['result'])
+
+@app.route('/status/<job_id>')
+def job_status(job_id):
+    """Poll a background analysis job"""
+    job = get_analysis_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job)
+
+@app.route('/processed/<path:filename>')
+def processed_file(filename):
+    """Serve processed previews - names are content hashes, so they never change"""
+    response = send_from_directory(PROCESSED_FOLDER, filename, conditional=True, max_age=86400)
+    response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    return response
+
 @app.route('/capture_image', methods=['POST'])
 def capture_image():
     """Handle camera capture from frontend"""
@@ -978,20 +1548,57 @@ def capture_image():
         # Decode base64 image
         image_bytes = base64.b64decode(image_data)
         
-        # Save image
-        filename = f"capture_{uuid.uuid4().hex}.jpg"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(image_bytes)
-        
-        # Analyze the image
-        analysis = analyze_image(filepath)
+        # Analyze the image in memory - the original capture is never written to disk
+        analysis = analyze_image_bytes(image_bytes, 'capture.jpg')
         
         return jsonify(analysis)
         
+    except RequestEntityTooLarge:
+        raise  # Handled by request_entity_too_large
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/stream_analyze', methods=['POST'])
+def stream_analyze():
+    """Server-sent events: 'token' events carry the analysis text as it is generated,
+    the final 'result' event carries the full analysis with category and recommendations"""
+    try:
+        if 'file' in request.files:
+            file = request.files['file']
+            if file.filename == '' or not allowed_file(file.filename):
+                return jsonify({'error': 'Invalid file type'}), 400
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+            file.save(filepath)
+            image, filename_hint = filepath, None
+        else:
+            data = request.get_json(silent=True) or {}
+            image_data = data.get('image')
+            
+            if not image_data:
+                return jsonify({'error': 'No image data received'}), 400
+            
+            # Remove data URL prefix
+            if ',' in image_data:
+                image_data = image_data.split(',')[1]
+            
+            # Camera captures are analyzed in memory
+            image, filename_hint = base64.b64decode(image_data), 'capture.jpg'
+        
+    except RequestEntityTooLarge:
+        raise  # Handled by request_entity_too_large
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        for event, data in stream_analyze_image(image, filename_hint):
+            payload = {'text': data} if event == 'token' else data
+            yield f"event: {event}\ndata: {app.json.dumps(payload)}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/analyze', methods=['POST'])
 def api_analyze():
@@ -1016,9 +1623,65 @@ def api_analyze():
         else:
             return jsonify({'error': 'Invalid file type'}), 400
             
+    except RequestEntityTooLarge:
+        raise  # Handled by request_entity_too_large
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze_batch', methods=['POST'])
+def api_analyze_batch():
+    """API endpoint for analyzing several images concurrently"""
+    try:
+        # MAX_CONTENT_LENGTH is per image, so allow a full batch of them in one request
+        request.max_content_length = MAX_BATCH_FILES * app.config['MAX_CONTENT_LENGTH']
+        files = request.files.getlist('files')
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        if len(files) > MAX_BATCH_FILES:
+            return jsonify({'error': f'Too many files. Maximum is {MAX_BATCH_FILES} images per batch'}), 400
+        
+        results = [None] * len(files)
+        filepaths = {}
+        saved_names = set()
+        for index, file in enumerate(files):
+            if not file.filename or not allowed_file(file.filename):
+                results[index] = {'filename': file.filename, 'error': 'Invalid file type'}
+                continue
+            
+            # Keep same-named files in one batch from overwriting each other
+            filename = secure_filename(file.filename)
+            if filename in saved_names:
+                name, ext = os.path.splitext(filename)
+                filename = f"{name}_{index}{ext}"
+            saved_names.add(filename)
+            
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            file.save(filepath)
+            filepaths[index] = filepath
+        
+        # Analyze all valid images concurrently
+        analyses = analyze_images_batch(list(filepaths.values()))
+        for (index, filepath), analysis in zip(filepaths.items(), analyses):
+            analysis['filename'] = files[index].filename
+            results[index] = analysis
+        
+        return jsonify(results)
+        
+    except RequestEntityTooLarge:
+        raise  # Handled by request_entity_too_large
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters and sizes of the AI result caches"""
+    return jsonify({
+        'results': result_cache.stats(),
+        'analysis': analysis_cache.stats(),
+        'recommendations': recommendations_cache.stats()
+    })
+
 @app.route('/tutorials')
 def tutorials():
     """Display tutorials and DIY projects"""
@@ -1034,6 +1697,7 @@ def about():
     return render_template('about.html')
 
 if __name__ == '__main__':
+    # Development server - production runs under gunicorn (see gunicorn.conf.py)
     # Hugging Face Spaces uses port 7860 by default, but we'll use environment variable
     port = int(os.getenv('PORT', 7860))
     debug = os.getenv('FLASK_ENV', 'production') == 'development'
@@ -0,0 +1,15 @@
+# Gunicorn settings for production - picked up automatically by `gunicorn app:app`
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
+
+# A single worker process: background analysis jobs and the AI result caches live
+# in process memory, so every request has to reach the same process. OpenAI calls
+# already overlap on the app's own asyncio event loop; request threads only wait
+# on them, so plenty of cheap threads give the concurrency
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+
+# Batch analyses and streamed responses can legitimately take a while
+timeout = 180